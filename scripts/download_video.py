@@ -4,43 +4,821 @@ Enhanced YouTube Video Downloader using pytubefix
 Optimized for high-quality 1080p downloads with intelligent stream selection
 """
 
-from pytubefix import YouTube
+from pytubefix import YouTube, extract
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import deque, namedtuple
+import urllib.request
+import urllib.error
 import subprocess
+import threading
 import tempfile
+import shutil
+import struct
 import json
+import time
 import sys
 import os
 
-def select_best_stream(yt, target_resolution='1080p'):
+try:
+    from diskcache import Cache
+except ImportError:  # Metadata caching is optional
+    Cache = None
+
+try:
+    import orjson
+except ImportError:  # Falls back to the stdlib encoder
+    orjson = None
+
+# Hardware encoder detected on first use, see pick_video_encoder()
+_VIDEO_ENCODER = None
+
+VAAPI_DEVICE = '/dev/dri/renderD128'
+
+# libx264 settings per quality level, used when no hardware encoder works
+X264_QUALITY = {
+    'fast': ['-preset', 'ultrafast', '-tune', 'zerolatency', '-crf', '26'],
+    'balanced': ['-preset', 'fast', '-crf', '23'],
+    'archival': ['-preset', 'slow', '-crf', '20']
+}
+
+# Put the moov atom first for progressive playback
+MP4_OUTPUT_ARGS = ['-movflags', '+faststart']
+
+# Re-encoded clips also start their timestamps at zero. Stream copies must
+# not: their frames before the cut point carry negative timestamps that
+# the MP4 edit list hides, and make_zero would shift them into view.
+ENCODE_OUTPUT_ARGS = [*MP4_OUTPUT_ARGS, '-avoid_negative_ts', 'make_zero']
+
+# Trailing ffmpeg stderr lines kept for error reports
+FFMPEG_LOG_LINES = 200
+
+# Ranged HTTP download settings
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+DOWNLOAD_WORKERS = 4
+INDEX_PROBE_SIZE = 64 * 1024
+MAX_INDEX_SIZE = 4 * 1024 * 1024
+HTTP_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+# Parsed video metadata and signed stream URLs, keyed by video ID
+METADATA_CACHE_DIR = os.path.join('.cache', 'pytube')
+METADATA_TTL = 3600
+try:
+    _metadata_cache = Cache(METADATA_CACHE_DIR) if Cache else None
+except OSError:  # Unwritable working directory, run uncached
+    _metadata_cache = None
+
+# Full stream downloads kept for repeated clips of the same video
+MEDIA_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'altrd')
+MEDIA_CACHE_MAX_BYTES = 5 * 1024 * 1024 * 1024
+# Videos used this recently may still be in use by another process
+MEDIA_CACHE_MIN_AGE = 3600
+
+def _memoize(func):
+    """Cache a function's results on disk when diskcache is installed"""
+    if _metadata_cache is None:
+        return func
+    return _metadata_cache.memoize(expire=METADATA_TTL)(func)
+
+def _ffmpeg_encoders():
+    """
+    List the encoders compiled into the local ffmpeg build
+    
+    Returns:
+        str: Raw output of `ffmpeg -encoders`, empty if ffmpeg is unusable
+    """
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-encoders'],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        return result.stdout
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+def _encoder_works(input_args, encoder_args):
+    """
+    Check that an encoder can actually open on this machine
+    
+    ffmpeg lists hardware encoders it was built with even when no GPU
+    is present, so a tiny test encode is the only reliable probe.
+    
+    Args:
+        input_args (list): Device setup arguments placed before the input
+        encoder_args (list): Encoder arguments to test
+    
+    Returns:
+        bool: True if the test encode succeeded
+    """
+    probe_cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        *input_args,
+        '-f', 'lavfi', '-i', 'color=black:s=256x256:d=0.1',
+        *encoder_args,
+        '-f', 'null', '-'
+    ]
+    try:
+        subprocess.run(probe_cmd, capture_output=True, check=True, timeout=30)
+        return True
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+def pick_video_encoder(quality='fast'):
+    """
+    Select the fastest working H.264 encoder, preferring hardware
+    
+    Order of preference is NVENC, VAAPI and finally libx264. Detection
+    runs once per process and is cached in a module global.
+    
+    Args:
+        quality (str): 'fast', 'balanced' or 'archival'. Only affects the
+            libx264 software fallback, see X264_QUALITY
+    
+    Returns:
+        dict: Encoder name plus the ffmpeg arguments it needs
+            - name (str): ffmpeg encoder name
+            - input_args (list): Arguments placed before the inputs
+            - decode_args (list): Hardware decode arguments placed right
+              before the video input so frames stay on the GPU
+            - download_filter (str|None): Filter moving GPU frames to
+              system memory for CPU-only filters such as subtitles
+            - upload_filter (str|None): Filter handing frames to the
+              encoder's device, applied last in the chain
+            - codec_args (list): Video codec and rate control arguments
+    """
+    if quality not in X264_QUALITY:
+        raise ValueError(f"Unknown quality: {quality}")
+    
+    encoder = _detect_video_encoder()
+    if encoder['name'] == 'libx264':
+        encoder = {
+            **encoder,
+            'codec_args': ['-c:v', 'libx264', *X264_QUALITY[quality]]
+        }
+    return encoder
+
+def _detect_video_encoder():
+    """
+    Detect the first working hardware encoder, falling back to libx264
+    
+    Returns:
+        dict: Encoder settings, see pick_video_encoder()
+    """
+    global _VIDEO_ENCODER
+    if _VIDEO_ENCODER is not None:
+        return _VIDEO_ENCODER
+    
+    available = _ffmpeg_encoders()
+    candidates = []
+    
+    if 'h264_nvenc' in available:
+        candidates.append({
+            'name': 'h264_nvenc',
+            'input_args': [],
+            'decode_args': ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda'],
+            'download_filter': 'hwdownload,format=nv12',
+            'upload_filter': None,  # NVENC accepts system memory frames too
+            'codec_args': [
+                '-c:v', 'h264_nvenc',
+                '-preset', 'p4',
+                '-tune', 'hq',
+                '-rc', 'vbr',
+                '-cq', '23',
+                '-b:v', '0'
+            ]
+        })
+    
+    if 'h264_vaapi' in available and os.path.exists(VAAPI_DEVICE):
+        candidates.append({
+            'name': 'h264_vaapi',
+            'input_args': ['-vaapi_device', VAAPI_DEVICE],
+            'decode_args': [
+                '-hwaccel', 'vaapi',
+                '-hwaccel_output_format', 'vaapi',
+                '-hwaccel_device', VAAPI_DEVICE
+            ],
+            'download_filter': 'hwdownload,format=nv12',
+            # Decoded VAAPI surfaces pass straight through; software
+            # frames (unsupported source codec) are uploaded instead
+            'upload_filter': 'format=nv12|vaapi,hwupload',
+            'codec_args': [
+                '-c:v', 'h264_vaapi',
+                '-qp', '23'
+            ]
+        })
+    
+    for candidate in candidates:
+        probe_args = candidate['codec_args']
+        if candidate['upload_filter']:
+            probe_args = ['-vf', candidate['upload_filter'], *probe_args]
+        if _encoder_works(candidate['input_args'], probe_args):
+            _VIDEO_ENCODER = candidate
+            return _VIDEO_ENCODER
+    
+    # Software fallback
+    _VIDEO_ENCODER = {
+        'name': 'libx264',
+        'input_args': [],
+        'decode_args': [],
+        'download_filter': None,
+        'upload_filter': None,
+        'codec_args': ['-c:v', 'libx264', *X264_QUALITY['balanced']]
+    }
+    return _VIDEO_ENCODER
+
+def _escape_filter_path(path):
+    """
+    Escape a file path for use as an ffmpeg filter option value
+    
+    Args:
+        path (str): File path
+    
+    Returns:
+        str: Path safe to embed in a filtergraph
+    """
+    # First escape for the option value, then for the filtergraph itself
+    for char in ('\\', ':', "'"):
+        path = path.replace(char, '\\' + char)
+    for char in ('\\', "'", ',', ';', '[', ']'):
+        path = path.replace(char, '\\' + char)
+    return path
+
+def _clip_inputs(inputs, duration, decode_args=(), first_index=0):
+    """
+    Build seeking input arguments for each (path, start) pair
+    
+    The first input carries the video stream, the last one the audio.
+    
+    Args:
+        inputs (list): (path, start_time) tuples, video first
+        duration (float): Clip duration
+        decode_args (list): Hardware decode arguments for the video input
+        first_index (int): ffmpeg input index of the first input, for
+            commands that open several clips' inputs
+    
+    Returns:
+        list: ffmpeg input and stream mapping arguments
+    """
+    args = []
+    for i, (path, start) in enumerate(inputs):
+        if i == 0:
+            args += decode_args
+        args += [
+            '-fflags', '+genpts',  # Fill in missing timestamps
+            '-ss', str(start), '-t', str(duration), '-i', path
+        ]
+    return args + [
+        '-map', f'{first_index}:v:0',
+        '-map', f'{first_index + len(inputs) - 1}:a:0'
+    ]
+
+def build_copy_cmd(inputs, duration, output_path):
+    """
+    Build an ffmpeg command that clips and muxes without re-encoding
+    
+    Seeking happens on the inputs, so ffmpeg jumps straight to the
+    keyframe before the start time instead of demuxing from the beginning.
+    
+    Args:
+        inputs (list): (path, start_time) tuples, video first
+        duration (float): Clip duration
+        output_path (str): Path to save final video
+    
+    Returns:
+        list: ffmpeg argument list
+    """
+    return [
+        'ffmpeg', '-y', '-loglevel', 'error',  # Completely suppress output
+        *_clip_inputs(inputs, duration),
+        '-c', 'copy',
+        *MP4_OUTPUT_ARGS,
+        output_path
+    ]
+
+def build_encode_cmd(inputs, duration, output_path, encoder, srt_path=None,
+                     hw_decode=False):
+    """
+    Build an ffmpeg command that re-encodes the clip, burning in subtitles
+    
+    Args:
+        inputs (list): (path, start_time) tuples, video first
+        duration (float): Clip duration
+        output_path (str): Path to save final video
+        encoder (dict): Encoder settings from pick_video_encoder()
+        srt_path (str, optional): SRT file timed relative to the clip start
+        hw_decode (bool): Decode on the encoder's device. Only safe when
+            the hardware decoder supports the source codec; otherwise
+            ffmpeg falls back to software frames and hwdownload fails
+    
+    Returns:
+        list: ffmpeg argument list
+    """
+    decode_args = encoder['decode_args'] if hw_decode else []
+    
+    filters = []
+    if srt_path:
+        # Subtitles render on the CPU, bracket them between GPU transfers
+        if hw_decode and encoder['download_filter']:
+            filters.append(encoder['download_filter'])
+        filters.append(f"subtitles=filename={_escape_filter_path(srt_path)}")
+    if encoder['upload_filter']:
+        filters.append(encoder['upload_filter'])
+    
+    ffmpeg_cmd = [
+        'ffmpeg', '-y', '-loglevel', 'error',  # Completely suppress output
+        *encoder['input_args'],
+        *_clip_inputs(inputs, duration, decode_args)
+    ]
+    if filters:
+        ffmpeg_cmd += ['-vf', ','.join(filters)]
+    ffmpeg_cmd += [
+        *encoder['codec_args'],
+        '-c:a', 'aac',
+        *ENCODE_OUTPUT_ARGS,
+        output_path
+    ]
+    return ffmpeg_cmd
+
+def build_multi_clip_cmd(sources, ranges, outputs):
+    """
+    Build one ffmpeg command cutting several stream-copied clips
+    
+    Every clip opens the files with its own input-side seek, exactly like
+    build_copy_cmd, so cut points match single clips and ffmpeg only
+    reads the windows it needs.
+    
+    Args:
+        sources (list): (path, start offset) tuples, video first, where
+            the offset is the source time at which the file begins
+        ranges (list): (start_time, end_time) tuples
+        outputs (list): Output path per range
+    
+    Returns:
+        list: ffmpeg argument list
+    """
+    ffmpeg_cmd = ['ffmpeg', '-y', '-loglevel', 'error']  # Completely suppress output
+    for i, ((start, end), output_path) in enumerate(zip(ranges, outputs)):
+        ffmpeg_cmd += [
+            *_clip_inputs(
+                [(path, start - offset) for path, offset in sources],
+                end - start,
+                first_index=i * len(sources)
+            ),
+            '-c', 'copy',
+            *MP4_OUTPUT_ARGS,
+            output_path
+        ]
+    return ffmpeg_cmd
+
+def start_ffmpeg(ffmpeg_cmd):
+    """
+    Start ffmpeg, keeping only the tail of its stderr in memory
+    
+    Args:
+        ffmpeg_cmd (list): ffmpeg argument list
+    
+    Returns:
+        tuple: (process, stderr reader thread, stderr line buffer)
+    """
+    process = subprocess.Popen(
+        ffmpeg_cmd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors='replace'  # Undecodable bytes must not kill the reader
+    )
+    log = deque(maxlen=FFMPEG_LOG_LINES)
+    reader = threading.Thread(
+        target=lambda: log.extend(line.rstrip('\n') for line in process.stderr),
+        daemon=True
+    )
+    reader.start()
+    return process, reader, log
+
+def finish_ffmpeg(ffmpeg_cmd, process, reader, log):
+    """
+    Wait for an ffmpeg process started with start_ffmpeg()
+    
+    Args:
+        ffmpeg_cmd (list): ffmpeg argument list
+        process (Popen): Running ffmpeg process
+        reader (Thread): stderr reader thread
+        log (deque): stderr line buffer
+    
+    Raises:
+        subprocess.CalledProcessError: If ffmpeg fails, with the last
+            stderr lines as stderr
+    """
+    process.wait()
+    reader.join()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(
+            process.returncode, ffmpeg_cmd, stderr='\n'.join(log)
+        )
+
+def run_ffmpeg(ffmpeg_cmd):
+    """
+    Run ffmpeg to completion with bounded stderr buffering
+    
+    Args:
+        ffmpeg_cmd (list): ffmpeg argument list
+    
+    Raises:
+        subprocess.CalledProcessError: If ffmpeg fails
+    """
+    finish_ffmpeg(ffmpeg_cmd, *start_ffmpeg(ffmpeg_cmd))
+
+def build_clip_cmd(inputs, duration, output_path, srt_path=None,
+                   quality='fast', video_codec=None):
+    """
+    Build the ffmpeg command for a clip, re-encoding only for subtitles
+    
+    Args:
+        inputs (list): (path, start_time) tuples, video first
+        duration (float): Clip duration
+        output_path (str): Path to save final video
+        srt_path (str, optional): Subtitles to burn in
+        quality (str): Software encoder quality, see pick_video_encoder()
+        video_codec (str, optional): Source video codec, hardware decoding
+            is only used for H.264 (avc1)
+    
+    Returns:
+        tuple: (ffmpeg argument list, encoder name, re-encode flag)
+    """
+    if srt_path is None:
+        return build_copy_cmd(inputs, duration, output_path), 'copy', False
+    
+    # Pick NVENC/VAAPI when available, libx264 otherwise
+    encoder = pick_video_encoder(quality)
+    ffmpeg_cmd = build_encode_cmd(
+        inputs, duration, output_path, encoder, srt_path,
+        hw_decode=(video_codec or '').startswith('avc1')
+    )
+    return ffmpeg_cmd, encoder['name'], True
+
+def _http_get(url, first, last):
+    """
+    Fetch an inclusive byte range of a remote file
+    
+    Args:
+        url (str): Stream URL
+        first (int): First byte offset
+        last (int): Last byte offset
+    
+    Returns:
+        bytes: Response body
+    
+    Raises:
+        ValueError: If the server ignored the range and sent more than
+            the requested bytes
+    """
+    request = urllib.request.Request(
+        url, headers={**HTTP_HEADERS, 'Range': f'bytes={first}-{last}'}
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        if response.status == 206:
+            return response.read()
+        # A plain 200 is only fine when the whole file fits the range
+        data = response.read(last + 2) if first == 0 else b''
+        if first != 0 or len(data) > last + 1:
+            raise ValueError("Server does not support byte range requests")
+        return data
+
+def _content_length(url):
+    """
+    Get the size of a remote file with a HEAD request
+    
+    Args:
+        url (str): Stream URL
+    
+    Returns:
+        int: Size in bytes
+    """
+    request = urllib.request.Request(url, headers=HTTP_HEADERS, method='HEAD')
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return int(response.headers['Content-Length'])
+
+def _chunk_bounds(first, last):
+    """
+    Split an inclusive byte range into DOWNLOAD_CHUNK_SIZE requests
+    
+    Args:
+        first (int): First byte offset
+        last (int): Last byte offset (inclusive)
+    
+    Returns:
+        list: (first byte, last byte) tuples
+    """
+    return [
+        (offset, min(offset + DOWNLOAD_CHUNK_SIZE, last + 1) - 1)
+        for offset in range(first, last + 1, DOWNLOAD_CHUNK_SIZE)
+    ]
+
+def _download_range(url, first, last, fh):
+    """
+    Download a byte range into an open file using parallel chunk requests
+    
+    Args:
+        url (str): Stream URL
+        first (int): First byte offset
+        last (int): Last byte offset (inclusive)
+        fh (file): Binary file object to append to
+    """
+    bounds = _chunk_bounds(first, last)
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as pool:
+        # Work in batches so at most DOWNLOAD_WORKERS chunks sit in memory
+        for i in range(0, len(bounds), DOWNLOAD_WORKERS):
+            batch = bounds[i:i + DOWNLOAD_WORKERS]
+            for data in pool.map(lambda b: _http_get(url, *b), batch):
+                fh.write(data)
+
+def _parse_sidx(data, offset, header_size, box_size):
+    """
+    Parse a segment index box into time and byte ranges
+    
+    Args:
+        data (bytes): Buffer holding the whole box
+        offset (int): Box offset in the file (and in data)
+        header_size (int): Size of the box header
+        box_size (int): Total box size
+    
+    Returns:
+        list: (start_seconds, end_seconds, first_byte, last_byte) tuples
+    """
+    pos = offset + header_size
+    version = data[pos]
+    timescale = struct.unpack_from('>I', data, pos + 8)[0]
+    pos += 12
+    if version == 0:
+        earliest, first_offset = struct.unpack_from('>II', data, pos)
+        pos += 8
+    else:
+        earliest, first_offset = struct.unpack_from('>QQ', data, pos)
+        pos += 16
+    reference_count = struct.unpack_from('>H', data, pos + 2)[0]
+    pos += 4
+    
+    segments = []
+    byte_offset = offset + box_size + first_offset
+    time = earliest
+    for _ in range(reference_count):
+        reference, duration = struct.unpack_from('>II', data, pos)
+        pos += 12
+        size = reference & 0x7FFFFFFF
+        segments.append((
+            time / timescale,
+            (time + duration) / timescale,
+            byte_offset,
+            byte_offset + size - 1
+        ))
+        time += duration
+        byte_offset += size
+    return segments
+
+def _read_sidx(url):
+    """
+    Read the initialization boxes and segment index of a DASH MP4 stream
+    
+    Args:
+        url (str): Stream URL
+    
+    Returns:
+        tuple|None: (init bytes, segments) or None when the stream has
+            no leading sidx box (e.g. progressive MP4)
+    """
+    data = _http_get(url, 0, INDEX_PROBE_SIZE - 1)
+    
+    def ensure(size):
+        nonlocal data
+        if size > MAX_INDEX_SIZE:
+            raise ValueError("Stream index too large")
+        if size > len(data):
+            data += _http_get(url, len(data), size - 1)
+    
+    init = bytearray()
+    offset = 0
+    while True:
+        ensure(offset + 16)
+        box_size, box_type = struct.unpack_from('>I4s', data, offset)
+        header_size = 8
+        if box_size == 1:
+            box_size = struct.unpack_from('>Q', data, offset + 8)[0]
+            header_size = 16
+        if box_size < header_size or box_type in (b'moof', b'mdat'):
+            return None
+        ensure(offset + box_size)
+        if box_type == b'sidx':
+            return bytes(init), _parse_sidx(data, offset, header_size, box_size)
+        init += data[offset:offset + box_size]
+        offset += box_size
+
+def plan_clip_window(url, start_time, end_time):
+    """
+    Work out which bytes of a stream cover a clip window
+    
+    Args:
+        url (str): Stream URL
+        start_time (float): Clip start time
+        end_time (float): Clip end time
+    
+    Returns:
+        tuple: (init bytes, first byte, last byte, start offset) where the
+            start offset is the source time at which the fetched data
+            begins. Streams without a segment index map to the whole file.
+    """
+    try:
+        index = _read_sidx(url)
+    except (ValueError, struct.error):
+        index = None
+    
+    if index:
+        init, segments = index
+        window = [
+            segment for segment in segments
+            if segment[1] > start_time and segment[0] < end_time
+        ]
+        if window:
+            return init, window[0][2], window[-1][3], window[0][0]
+    
+    # No usable index, fetch everything
+    return b'', 0, _content_length(url) - 1, 0.0
+
+def download_plan(url, plan, dest):
+    """
+    Download the stream fragments selected by plan_clip_window()
+    
+    The init boxes are written first, followed by the fragments that
+    overlap the clip window.
+    
+    Args:
+        url (str): Stream URL
+        plan (tuple): Result of plan_clip_window()
+        dest (str): Path to write the (partial) MP4 to
+    """
+    init, first, last, _ = plan
+    with open(dest, 'wb') as fh:
+        fh.write(init)
+        _download_range(url, first, last, fh)
+
+def _stream_to_fifo(url, plan, fifo_path):
+    """
+    Feed a planned byte range into a named pipe read by ffmpeg
+    
+    The next chunk is prefetched while the current one is written. Once
+    ffmpeg has read up to the clip end it closes the pipe, which stops
+    the download early.
+    
+    Args:
+        url (str): Stream URL
+        plan (tuple): Result of plan_clip_window()
+        fifo_path (str): Named pipe to write to
+    """
+    init, first, last, _ = plan
+    bounds = _chunk_bounds(first, last)
+    try:
+        with open(fifo_path, 'wb') as fifo, \
+                ThreadPoolExecutor(max_workers=1) as pool:
+            fifo.write(init)
+            pending = pool.submit(_http_get, url, *bounds[0])
+            for next_bounds in bounds[1:] + [None]:
+                data = pending.result()
+                if next_bounds:
+                    pending = pool.submit(_http_get, url, *next_bounds)
+                fifo.write(data)
+    except BrokenPipeError:
+        pass
+
+def _release_fifo(fifo_path):
+    """
+    Unblock a writer stuck opening a pipe that ffmpeg never opened
+    
+    Args:
+        fifo_path (str): Named pipe path
+    """
+    try:
+        os.close(os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK))
+    except OSError:
+        pass
+
+def run_streaming(ffmpeg_cmd, sources):
+    """
+    Run ffmpeg on named pipes while the streams are still downloading
+    
+    Args:
+        ffmpeg_cmd (list): ffmpeg argument list reading from the pipes
+        sources (list): (url, plan, fifo_path) tuples
+    
+    Raises:
+        subprocess.CalledProcessError: If ffmpeg fails
+    """
+    with ThreadPoolExecutor(max_workers=len(sources)) as pool:
+        process, reader, log = start_ffmpeg(ffmpeg_cmd)
+        writers = [pool.submit(_stream_to_fifo, *source) for source in sources]
+        process.wait()
+        
+        # A writer may still be opening its pipe, keep releasing until done
+        while wait(writers, timeout=0.1).not_done:
+            for _, _, fifo_path in sources:
+                _release_fifo(fifo_path)
+        for writer in writers:
+            writer.result()
+    
+    finish_ffmpeg(ffmpeg_cmd, process, reader, log)
+
+# Preferred (video, audio) codec prefixes: H.264 and AAC can be stream
+# copied into MP4 and hardware decoded almost everywhere
+CODEC_PREFER = ('avc1', 'mp4a')
+
+# Stream paired with its parsed resolution or bitrate
+_RankedStream = namedtuple('_RankedStream', ['value', 'stream'])
+
+def _filter_codec(streams, attribute, prefix):
+    """
+    Keep only streams whose codec starts with prefix, if there are any
+    
+    Args:
+        streams (list): Candidate streams
+        attribute (str): 'video_codec' or 'audio_codec'
+        prefix (str): Codec prefix such as 'avc1', None to disable
+    
+    Returns:
+        list: Matching streams, or all streams when none match
+    """
+    if not prefix:
+        return list(streams)
+    matching = [
+        s for s in streams
+        if (getattr(s, attribute, None) or '').startswith(prefix)
+    ]
+    return matching or list(streams)
+
+def _parse_quality(value, suffix):
+    """
+    Parse a pytubefix quality label such as '1080p' or '128kbps'
+    
+    Args:
+        value (str): Label, possibly None or 'None'
+        suffix (str): Unit suffix to strip
+    
+    Returns:
+        int: Numeric value, 0 when missing
+    """
+    if not value or value == 'None':
+        return 0
+    return int(value[:-len(suffix)]) if value.endswith(suffix) else int(value)
+
+def select_best_stream(yt, target_resolution='1080p',
+                       prefer_progressive_below='720p',
+                       codec_prefer=CODEC_PREFER):
     """
     Intelligently select the best video stream
     
     Args:
         yt (YouTube): YouTube video object
         target_resolution (str): Preferred resolution
+        prefer_progressive_below (str): For targets up to this resolution,
+            a progressive stream (video with audio) reaching the target is
+            preferred, which avoids a separate audio download and merge
+        codec_prefer (tuple): Preferred (video, audio) codec prefixes,
+            DASH streams in other codecs are only used as a fallback.
+            None (or a None entry) disables the preference
     
     Returns:
         Stream: Best matching video stream
     """
     try:
+        target = _parse_quality(target_resolution, 'p')
+        if target <= _parse_quality(prefer_progressive_below, 'p'):
+            progressive_stream = yt.streams.filter(
+                progressive=True,
+                file_extension='mp4'
+            ).get_highest_resolution()
+            if (progressive_stream and
+                    _parse_quality(progressive_stream.resolution, 'p') >= target):
+                return progressive_stream
+        
         # First, try to find DASH streams matching target resolution
         streams = yt.streams.filter(
             progressive=False,
             file_extension='mp4',
             type='video'
         )
+        video_codec, _ = codec_prefer or (None, None)
+        streams = _filter_codec(streams, 'video_codec', video_codec)
         
-        # Sort streams by resolution, prioritizing target resolution
-        sorted_streams = sorted(
-            streams, 
-            key=lambda s: (
-                0 if s.resolution and s.resolution == target_resolution else 1,  # Prioritize target resolution
-                -int(s.resolution.replace('p', '')) if s.resolution and s.resolution != 'None' else 0  # Then sort by resolution
-            )
-        )
+        # Parse each resolution to an integer once, then pick the target
+        # resolution or else the highest one with plain integer compares
+        ranked = [
+            _RankedStream(_parse_quality(resolution, 'p'), s)
+            for s in streams if (resolution := s.resolution)
+        ]
         
-        if sorted_streams:
-            return sorted_streams[0]
+        if ranked:
+            return min(
+                ranked,
+                key=lambda entry: (entry.value != target, -entry.value)
+            ).stream
         
         # Fallback to progressive streams if no DASH streams found
         progressive_streams = yt.streams.filter(
@@ -57,12 +835,14 @@ def select_best_stream(yt, target_resolution='1080p'):
     except Exception as e:
         raise RuntimeError(f"Stream selection error: {str(e)}")
 
-def select_best_audio_stream(yt):
+def select_best_audio_stream(yt, codec_prefer=CODEC_PREFER):
     """
     Select the highest quality audio stream
     
     Args:
         yt (YouTube): YouTube video object
+        codec_prefer (tuple): Preferred (video, audio) codec prefixes,
+            None disables the preference
     
     Returns:
         Stream: Best audio stream
@@ -77,91 +857,483 @@ def select_best_audio_stream(yt):
         if not audio_streams:
             # Fallback to any audio stream
             audio_streams = yt.streams.filter(type='audio')
+        _, audio_codec = codec_prefer or (None, None)
+        audio_streams = _filter_codec(audio_streams, 'audio_codec', audio_codec)
         
-        # Sort by audio bitrate, highest first
-        sorted_audio_streams = sorted(
-            audio_streams, 
-            key=lambda s: int(s.abr.replace('kbps', '') if s.abr and s.abr != 'None' else 0), 
-            reverse=True
-        )
+        # Highest audio bitrate, parsing each bitrate once
+        ranked = [
+            _RankedStream(_parse_quality(s.abr, 'kbps'), s)
+            for s in audio_streams
+        ]
         
-        if sorted_audio_streams:
-            return sorted_audio_streams[0]
+        if ranked:
+            return max(ranked, key=lambda entry: entry.value).stream
         
         raise ValueError("No suitable audio streams found")
     
     except Exception as e:
         raise RuntimeError(f"Audio stream selection error: {str(e)}")
 
-def download_video(url, start_time, end_time, output_path):
+def _describe_stream(stream):
+    """
+    Reduce a pytubefix stream to the plain fields needed for clipping
+    
+    Args:
+        stream (Stream): Selected stream
+    
+    Returns:
+        dict: Picklable stream description
+    """
+    return {
+        "itag": stream.itag,
+        "url": stream.url,
+        "resolution": getattr(stream, 'resolution', None),
+        "fps": getattr(stream, 'fps', None),
+        "abr": getattr(stream, 'abr', None),
+        "video_codec": getattr(stream, 'video_codec', None),
+        "progressive": stream.is_progressive
+    }
+
+@_memoize
+def get_video_metadata(video_id, resolution='1080p'):
+    """
+    Fetch title, length and the selected streams for a video
+    
+    Results are cached on disk for METADATA_TTL seconds, so repeated
+    clips of one video skip the watch page, player JS and cipher work.
+    
+    Args:
+        video_id (str): YouTube video ID
+        resolution (str): Preferred video resolution
+    
+    Returns:
+        dict: Video metadata with "video" and "audio" stream descriptions,
+            "audio" being None when the video stream is progressive
+    """
+    yt = YouTube(f'https://www.youtube.com/watch?v={video_id}')
+    video_stream = select_best_stream(yt, resolution)
+    audio_stream = None
+    if not video_stream.is_progressive:
+        audio_stream = _describe_stream(select_best_audio_stream(yt))
+    return {
+        "title": yt.title,
+        "length": yt.length,
+        "video": _describe_stream(video_stream),
+        "audio": audio_stream
+    }
+
+def forget_video_metadata(video_id, resolution='1080p'):
+    """
+    Drop cached metadata, e.g. once its signed stream URLs expired
+    
+    Args:
+        video_id (str): YouTube video ID
+        resolution (str): Preferred video resolution
+    """
+    if _metadata_cache is not None:
+        _metadata_cache.delete(
+            get_video_metadata.__cache_key__(video_id, resolution)
+        )
+
+def _selected_streams(metadata):
+    """
+    List the streams to download, video first
+    
+    Args:
+        metadata (dict): Result of get_video_metadata()
+    
+    Returns:
+        list: Stream descriptions
+    """
+    if metadata["audio"] is None:
+        return [metadata["video"]]
+    return [metadata["video"], metadata["audio"]]
+
+def _clip_result(metadata, output_path, duration, encoder_name, reencode):
+    """
+    Build the success result returned for a clip
+    
+    Args:
+        metadata (dict): Result of get_video_metadata()
+        output_path (str): Path of the final video
+        duration (float): Clip duration
+        encoder_name (str): Video encoder used, 'copy' for stream copy
+        reencode (bool): Whether the video was re-encoded
+    
+    Returns:
+        dict: Download result with metadata
+    """
+    return {
+        "success": True,
+        "output_path": output_path,
+        "title": metadata["title"],
+        "resolution": metadata["video"]["resolution"],
+        "duration": duration,
+        "video_fps": metadata["video"]["fps"],
+        "audio_bitrate": _selected_streams(metadata)[-1]["abr"],
+        "encoder": encoder_name,
+        "reencode": reencode
+    }
+
+def _evict_media_cache(cache_dir, keep):
+    """
+    Delete least recently used videos until the cache fits its budget
+    
+    Other processes may be downloading into or cutting from the cache, so
+    directories without a complete metadata file or used within the last
+    MEDIA_CACHE_MIN_AGE seconds are never evicted.
+    
+    Args:
+        cache_dir (str): Media cache root
+        keep (str): Video directory that must not be evicted
+    """
+    now = time.time()
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            if not os.path.isdir(path):
+                continue
+            files = os.listdir(path)
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in files)
+            mtime = os.path.getmtime(path)
+        except OSError:
+            continue  # Removed by a concurrent eviction
+        total += size
+        complete = any(
+            f.startswith('metadata_') and f.endswith('.json') for f in files
+        )
+        if complete and path != keep and now - mtime > MEDIA_CACHE_MIN_AGE:
+            entries.append((mtime, size, path))
+    
+    for _, size, path in sorted(entries):
+        if total <= MEDIA_CACHE_MAX_BYTES:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+def _download_full(url, dest):
+    """
+    Download a whole stream, only exposing the file once complete
+    
+    The partial file gets a unique name, so concurrent processes caching
+    the same video never write into each other's download.
+    
+    Args:
+        url (str): Stream URL
+        dest (str): Final file path
+    """
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(dest), suffix='.part')
+    os.close(fd)
+    try:
+        download_plan(url, (b'', 0, _content_length(url) - 1, 0.0), partial)
+        os.replace(partial, dest)
+    except BaseException:
+        os.unlink(partial)
+        raise
+
+def _media_cache_paths(cache_dir, video_id, resolution):
+    """
+    Locate the cached files of a video at one resolution
+    
+    Args:
+        cache_dir (str): Media cache root
+        video_id (str): YouTube video ID
+        resolution (str): Preferred video resolution
+    
+    Returns:
+        tuple: (video directory, video file, audio file, metadata file)
+    """
+    workdir = os.path.join(cache_dir, video_id)
+    return (
+        workdir,
+        os.path.join(workdir, f'video_{resolution}.mp4'),
+        os.path.join(workdir, f'audio_{resolution}.mp4'),
+        os.path.join(workdir, f'metadata_{resolution}.json')
+    )
+
+def fetch_streams(url, cache_dir=MEDIA_CACHE_DIR, resolution='1080p'):
+    """
+    Download the full video and audio streams once for repeated clipping
+    
+    Files live in a per-video directory under cache_dir, which is evicted
+    least recently used first once it exceeds MEDIA_CACHE_MAX_BYTES.
+    
+    Args:
+        url (str): YouTube video URL
+        cache_dir (str): Media cache root
+        resolution (str): Preferred video resolution
+    
+    Returns:
+        tuple: (video file, audio file, metadata), the audio file being
+            None for progressive streams
+    """
+    video_id = extract.video_id(url)
+    workdir, video_file, audio_file, metadata_file = _media_cache_paths(
+        cache_dir, video_id, resolution
+    )
+    
+    if os.path.exists(metadata_file):
+        # Mark as recently used
+        os.utime(workdir)
+        with open(metadata_file) as f:
+            metadata = json.load(f)
+    else:
+        os.makedirs(workdir, exist_ok=True)
+        metadata = get_video_metadata(video_id, resolution)
+        files = [video_file, audio_file]
+        try:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                downloads = [
+                    pool.submit(_download_full, stream["url"], path)
+                    for stream, path in zip(_selected_streams(metadata), files)
+                ]
+                for download in downloads:
+                    download.result()
+        except urllib.error.HTTPError as e:
+            if e.code != 403:
+                raise
+            # Cached stream URLs are signed and expire, refresh and retry
+            forget_video_metadata(video_id, resolution)
+            metadata = get_video_metadata(video_id, resolution)
+            for stream, path in zip(_selected_streams(metadata), files):
+                _download_full(stream["url"], path)
+        
+        # Written last, so its presence marks a complete entry
+        with open(metadata_file, 'w') as f:
+            json.dump(metadata, f)
+        
+        _evict_media_cache(cache_dir, keep=workdir)
+    
+    if metadata["audio"] is None:
+        audio_file = None
+    return video_file, audio_file, metadata
+
+def cut(video_file, audio_file, start_time, end_time, output_path,
+        srt_path=None, quality='fast', video_codec=None):
+    """
+    Clip already downloaded video and audio streams
+    
+    Args:
+        video_file (str): Video input
+        audio_file (str): Audio-only input, or None when the video file
+            already carries audio
+        start_time (float): Clip start time
+        end_time (float): Clip end time
+        output_path (str): Path to save final video
+        srt_path (str, optional): Subtitles to burn in, timed relative to
+            the clip start
+        quality (str): Software encoder quality, see pick_video_encoder()
+        video_codec (str, optional): Source video codec, see build_clip_cmd()
+    
+    Returns:
+        tuple: (encoder name, re-encode flag)
+    """
+    files = [video_file] if audio_file is None else [video_file, audio_file]
+    ffmpeg_cmd, encoder_name, reencode = build_clip_cmd(
+        [(path, start_time) for path in files],
+        end_time - start_time, output_path, srt_path, quality, video_codec
+    )
+    
+    # Ensure output directory exists
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    
+    run_ffmpeg(ffmpeg_cmd)
+    return encoder_name, reencode
+
+def _plan_windows(streams, start_time, end_time, temp_dir):
+    """
+    Plan the fragments of each stream covering a time window
+    
+    Args:
+        streams (list): Stream descriptions, video first
+        start_time (float): Window start time
+        end_time (float): Window end time
+        temp_dir (str): Directory for the partial files
+    
+    Returns:
+        list: (url, plan, path) tuples, see plan_clip_window()
+    """
+    files = [
+        os.path.join(temp_dir, name)
+        for name in ('video.mp4', 'audio.mp4')[:len(streams)]
+    ]
+    
+    # Video and audio concurrently over separate connections
+    with ThreadPoolExecutor(max_workers=len(streams)) as pool:
+        plans = list(pool.map(
+            lambda stream: plan_clip_window(
+                stream["url"], start_time, end_time
+            ),
+            streams
+        ))
+    return [
+        (stream["url"], plan, path)
+        for stream, plan, path in zip(streams, plans, files)
+    ]
+
+def _download_window(streams, start_time, end_time, temp_dir):
+    """
+    Download the fragments of each stream covering a time window
+    
+    Args:
+        streams (list): Stream descriptions, video first
+        start_time (float): Window start time
+        end_time (float): Window end time
+        temp_dir (str): Directory to write the partial files to
+    
+    Returns:
+        list: (path, start offset) tuples, see plan_clip_window()
+    """
+    sources = _plan_windows(streams, start_time, end_time, temp_dir)
+    with ThreadPoolExecutor(max_workers=len(sources)) as pool:
+        downloads = [
+            pool.submit(download_plan, *source) for source in sources
+        ]
+        for download in downloads:
+            download.result()
+    
+    return [(path, plan[3]) for _, plan, path in sources]
+
+def _clip_streams(metadata, start_time, end_time, output_path, srt_path,
+                  stream_mode, quality):
+    """
+    Fetch the clip window of the selected streams and run ffmpeg on it
+    
+    Args:
+        metadata (dict): Result of get_video_metadata()
+        start_time (float): Clip start time
+        end_time (float): Clip end time
+        output_path (str): Path to save final video
+        srt_path (str): Subtitles to burn in, or None
+        stream_mode (bool): Pipe downloads straight into ffmpeg when
+            re-encoding
+        quality (str): Software encoder quality, see pick_video_encoder()
+    
+    Returns:
+        dict: Download result with metadata
+    """
+    streams = _selected_streams(metadata)
+    
+    # Use temporary directory for intermediate files
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # ffmpeg cannot seek a pipe. Re-encoding still trims decoded
+        # frames to the exact start, but a stream copy would keep the
+        # whole leading fragment, so copy clips always go through files
+        # and get the same cut points as file mode
+        streaming = (
+            stream_mode and srt_path is not None and hasattr(os, 'mkfifo')
+        )
+        
+        # Work with only the fragments covering the clip
+        if streaming:
+            sources = _plan_windows(streams, start_time, end_time, temp_dir)
+            
+            # Data flows through the pipes once ffmpeg is running
+            for _, _, path in sources:
+                os.mkfifo(path)
+            offsets = [(path, plan[3]) for _, plan, path in sources]
+        else:
+            offsets = _download_window(
+                streams, start_time, end_time, temp_dir
+            )
+        
+        inputs = [(path, start_time - offset) for path, offset in offsets]
+        
+        # Ensure output directory exists
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        
+        # FFmpeg command for merging and clipping
+        ffmpeg_cmd, encoder_name, reencode = build_clip_cmd(
+            inputs, end_time - start_time, output_path, srt_path, quality,
+            metadata["video"].get("video_codec")
+        )
+        
+        # Run FFmpeg with error checking
+        if streaming:
+            run_streaming(ffmpeg_cmd, sources)
+        else:
+            run_ffmpeg(ffmpeg_cmd)
+        
+        return _clip_result(
+            metadata, output_path, end_time - start_time,
+            encoder_name, reencode
+        )
+
+def download_video(url, start_time, end_time, output_path, srt_path=None,
+                   stream_mode=False, cache_media=False, quality='fast',
+                   resolution='1080p'):
     """
     Download and process YouTube video with intelligent stream handling
     
+    The clip is stream-copied unless subtitles have to be burned in, in
+    which case it is re-encoded with the fastest available encoder.
+    In stream mode a re-encode reads the downloads through named pipes
+    so encoding overlaps the transfer; stream copies and platforms
+    without os.mkfifo use temporary files instead. Videos already in the
+    media cache (see fetch_streams) are clipped locally without
+    downloading anything.
+    
     Args:
         url (str): YouTube video URL
         start_time (float): Clip start time
         end_time (float): Clip end time
         output_path (str): Path to save final video
+        srt_path (str, optional): Subtitles to burn in, timed relative to
+            the clip start
+        stream_mode (bool): Pipe downloads straight into ffmpeg when
+            subtitles force a re-encode
+        cache_media (bool): Download the full streams into the media
+            cache so later clips of this video skip the download
+        quality (str): 'fast', 'balanced' or 'archival' trade-off for the
+            libx264 fallback when subtitles force a re-encode
+        resolution (str): Preferred video resolution. Low resolutions may
+            use a progressive stream, skipping the audio download
     
     Returns:
         dict: Download result with metadata
     """
     try:
-        # Create YouTube object
-        yt = YouTube(url)
+        video_id = extract.video_id(url)
+        cached = os.path.exists(
+            _media_cache_paths(MEDIA_CACHE_DIR, video_id, resolution)[3]
+        )
+        if cache_media or cached:
+            video_file, audio_file, metadata = fetch_streams(
+                url, resolution=resolution
+            )
+            end_time = min(end_time, metadata["length"])
+            encoder_name, reencode = cut(
+                video_file, audio_file, start_time, end_time, output_path,
+                srt_path, quality, metadata["video"].get("video_codec")
+            )
+            return _clip_result(
+                metadata, output_path, end_time - start_time,
+                encoder_name, reencode
+            )
+        
+        metadata = get_video_metadata(video_id, resolution)
         
         # Validate video length
-        video_length = yt.length
+        video_length = metadata["length"]
         if end_time > video_length:
             end_time = min(end_time, video_length)
         
-        # Select best streams
-        video_stream = select_best_stream(yt)
-        audio_stream = select_best_audio_stream(yt)
-        
-        # Use temporary directory for intermediate files
-        with tempfile.TemporaryDirectory() as temp_dir:
-            video_file = os.path.join(temp_dir, 'video.mp4')
-            audio_file = os.path.join(temp_dir, 'audio.mp4')
-            
-            # Download streams silently
-            video_stream.download(output_path=temp_dir, filename='video.mp4')
-            audio_stream.download(output_path=temp_dir, filename='audio.mp4')
-            
-            # Ensure output directory exists
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            
-            # FFmpeg command for merging and clipping
-            ffmpeg_cmd = [
-                'ffmpeg', '-y', '-loglevel', 'error',  # Completely suppress output
-                '-i', video_file,
-                '-i', audio_file,
-                '-ss', str(start_time),
-                '-t', str(end_time - start_time),
-                '-c:v', 'libx264',
-                '-c:a', 'aac',
-                '-preset', 'fast',
-                '-crf', '23',  # Balanced quality and file size
-                output_path
-            ]
-            
-            # Run FFmpeg with error checking
-            subprocess.run(
-                ffmpeg_cmd, 
-                capture_output=True, 
-                text=True,
-                check=True
+        try:
+            return _clip_streams(
+                metadata, start_time, end_time, output_path, srt_path,
+                stream_mode, quality
+            )
+        except urllib.error.HTTPError as e:
+            if e.code != 403:
+                raise
+            # Cached stream URLs are signed and expire, refresh and retry
+            forget_video_metadata(video_id, resolution)
+            return _clip_streams(
+                get_video_metadata(video_id, resolution), start_time, end_time,
+                output_path, srt_path, stream_mode, quality
             )
-            
-            return {
-                "success": True,
-                "output_path": output_path,
-                "title": yt.title,
-                "resolution": video_stream.resolution,
-                "duration": end_time - start_time,
-                "video_fps": video_stream.fps,
-                "audio_bitrate": audio_stream.abr
-            }
     
     except subprocess.CalledProcessError as e:
         return {
@@ -174,12 +1346,246 @@ def download_video(url, start_time, end_time, output_path):
             "error": str(e)
         }
 
+def _check_ranges(ranges, outputs):
+    """
+    Reject mismatched outputs and empty or negative clip ranges
+    
+    Args:
+        ranges (list): (start_time, end_time) tuples
+        outputs (list): Output path per range
+    
+    Raises:
+        ValueError: If the arguments cannot describe a set of clips
+    """
+    if len(ranges) != len(outputs):
+        raise ValueError("Each clip range needs exactly one output path")
+    for start, end in ranges:
+        if start < 0 or start >= end:
+            raise ValueError(f"Invalid clip range: {start}-{end}")
+
+def _clamp_ranges(ranges, video_length):
+    """
+    Clamp clip ranges to the video, rejecting ones past its end
+    
+    Args:
+        ranges (list): (start_time, end_time) tuples
+        video_length (float): Video length in seconds
+    
+    Returns:
+        list: Clamped (start_time, end_time) tuples
+    """
+    clamped = []
+    for start, end in ranges:
+        end = min(end, video_length)
+        if start >= end:
+            raise ValueError(f"Clip range starts past the video end: {start}")
+        clamped.append((start, end))
+    return clamped
+
+def _cut_clips(metadata, sources, ranges, outputs):
+    """
+    Cut stream-copied clips from local files in a single ffmpeg run
+    
+    Args:
+        metadata (dict): Result of get_video_metadata()
+        sources (list): (path, start offset) tuples, video first
+        ranges (list): (start_time, end_time) tuples
+        outputs (list): Output path per range
+    
+    Returns:
+        list: Download result with metadata per clip
+    """
+    # Ensure output directories exist
+    for output_path in outputs:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    
+    run_ffmpeg(build_multi_clip_cmd(sources, ranges, outputs))
+    
+    return [
+        _clip_result(metadata, output_path, end - start, 'copy', False)
+        for (start, end), output_path in zip(ranges, outputs)
+    ]
+
+def _clip_windows(metadata, ranges, outputs):
+    """
+    Download the window spanning all ranges and cut the clips from it
+    
+    Args:
+        metadata (dict): Result of get_video_metadata()
+        ranges (list): (start_time, end_time) tuples
+        outputs (list): Output path per range
+    
+    Returns:
+        list: Download result with metadata per clip
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sources = _download_window(
+            _selected_streams(metadata),
+            min(start for start, _ in ranges),
+            max(end for _, end in ranges),
+            temp_dir
+        )
+        return _cut_clips(metadata, sources, ranges, outputs)
+
+def download_clips(url, ranges, outputs, resolution='1080p',
+                   cache_media=False):
+    """
+    Cut several clips from one video with a single ffmpeg run
+    
+    Every clip is stream-copied with the same cut points as
+    download_video, so N clips cost one download and one ffmpeg process
+    instead of N of each. Only the fragments spanning the ranges are
+    downloaded unless the video is in the media cache (see fetch_streams).
+    
+    Args:
+        url (str): YouTube video URL
+        ranges (list): (start_time, end_time) tuples
+        outputs (list): Path to save each clip to
+        resolution (str): Preferred video resolution
+        cache_media (bool): Download the full streams into the media
+            cache so later clips of this video skip the download
+    
+    Returns:
+        list: Download result with metadata per clip
+    """
+    try:
+        _check_ranges(ranges, outputs)
+        video_id = extract.video_id(url)
+        cached = os.path.exists(
+            _media_cache_paths(MEDIA_CACHE_DIR, video_id, resolution)[3]
+        )
+        if cache_media or cached:
+            video_file, audio_file, metadata = fetch_streams(
+                url, resolution=resolution
+            )
+            ranges = _clamp_ranges(ranges, metadata["length"])
+            files = [video_file] if audio_file is None else [video_file, audio_file]
+            return _cut_clips(
+                metadata, [(path, 0.0) for path in files], ranges, outputs
+            )
+        
+        metadata = get_video_metadata(video_id, resolution)
+        ranges = _clamp_ranges(ranges, metadata["length"])
+        
+        try:
+            return _clip_windows(metadata, ranges, outputs)
+        except urllib.error.HTTPError as e:
+            if e.code != 403:
+                raise
+            # Cached stream URLs are signed and expire, refresh and retry
+            forget_video_metadata(video_id, resolution)
+            return _clip_windows(
+                get_video_metadata(video_id, resolution), ranges, outputs
+            )
+    
+    except subprocess.CalledProcessError as e:
+        error = f"FFmpeg error: {e.stderr}"
+    except Exception as e:
+        error = str(e)
+    return [{"success": False, "error": error} for _ in outputs]
+
+def to_json(result):
+    """
+    Serialize a result dict, using orjson when it is installed
+    
+    Args:
+        result (dict): Result to serialize
+    
+    Returns:
+        str: JSON text
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(result).decode()
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits, which json handles
+    return json.dumps(result)
+
+def _bool_option(request, name):
+    """
+    Read an optional boolean request field, rejecting other types
+    
+    Args:
+        request (dict): Parsed request
+        name (str): Field name
+    
+    Returns:
+        bool: Field value, False when absent
+    """
+    value = request.get(name, False)
+    if not isinstance(value, bool):
+        raise TypeError(f"{name} must be a boolean")
+    return value
+
+def handle_request(line):
+    """
+    Run one newline-delimited JSON request in server mode
+    
+    Args:
+        line (bytes): UTF-8 JSON object with url, start, end and output,
+            plus optional srt, stream_mode, cache_media, quality,
+            resolution and an id echoed back in the result
+    
+    Returns:
+        dict: Download result with metadata
+    """
+    request = None
+    try:
+        request = json.loads(line.decode('utf-8'))
+        if not isinstance(request, dict):
+            raise TypeError("request must be a JSON object")
+        result = download_video(
+            request["url"],
+            float(request["start"]),
+            float(request["end"]),
+            request["output"],
+            srt_path=request.get("srt"),
+            stream_mode=_bool_option(request, "stream_mode"),
+            cache_media=_bool_option(request, "cache_media"),
+            quality=request.get("quality", 'fast'),
+            resolution=request.get("resolution", '1080p')
+        )
+    except (ValueError, TypeError, KeyError) as e:
+        result = {
+            "success": False,
+            "error": f"Invalid request: {e}"
+        }
+    
+    if isinstance(request, dict) and "id" in request:
+        result["id"] = request["id"]
+    return result
+
+def serve():
+    """
+    Serve download requests from stdin until it closes
+    
+    Keeps one warm interpreter with pytubefix loaded for many clips, and
+    the detected encoder stays in memory between requests.
+    """
+    for line in sys.stdin.buffer:
+        if not line.strip():
+            continue
+        try:
+            response = to_json(handle_request(line))
+        except Exception as e:
+            # A single bad request must never take the server down
+            response = to_json({
+                "success": False,
+                "error": f"Request failed: {e}"
+            })
+        sys.stdout.write(response + '\n')
+        sys.stdout.flush()
+
 def main():
     """Main function to handle command line arguments"""
+    if sys.argv[1:] == ['--server']:
+        serve()
+        return
+    
     if len(sys.argv) != 5:
-        print(json.dumps({
+        print(to_json({
             "success": False,
-            "error": "Usage: python download_video.py <url> <start_time> <end_time> <output_path>"
+            "error": "Usage: python download_video.py <url> <start_time> <end_time> <output_path> | --server"
         }))
         sys.exit(1)
     
@@ -187,7 +1593,7 @@ def main():
     result = download_video(url, float(start_time), float(end_time), output_path)
     
     # Ensure clean JSON output with no additional characters
-    sys.stdout.write(json.dumps(result) + '\n')
+    sys.stdout.write(to_json(result) + '\n')
     sys.stdout.flush()
 
 if __name__ == "__main__":